@@ -1,9 +1,24 @@
 #!/usr/bin/env python3
+import os
+
 import aws_cdk as cdk
 from stacks.data_pipeline_stack import DataPipelineStack
 
+
+def stack_selected(stack_id: str) -> bool:
+    # CDK_STACKS=Id1,Id2 builds only those stacks; CDK_STACKS_DISABLE_FILTER=1 builds all
+    wanted = os.environ.get("CDK_STACKS")
+    if not wanted or os.environ.get("CDK_STACKS_DISABLE_FILTER") == "1":
+        return True
+    return stack_id in wanted.split(",")
+
+
 app = cdk.App()
-DataPipelineStack(app, "DataPipelineStack",
-    env=cdk.Environment(account="339712743071", region="us-east-1")
-)
+if stack_selected("DataPipelineStack"):
+    DataPipelineStack(app, "DataPipelineStack",
+        env=cdk.Environment(
+            account=os.environ.get("CDK_DEFAULT_ACCOUNT", "339712743071"),
+            region=os.environ.get("CDK_DEFAULT_REGION", "us-east-1"),
+        )
+    )
 app.synth()
@@ -1,6 +1,11 @@
+import os
+from functools import lru_cache
+
 from aws_cdk import (
+    AssetHashType,
     Stack,
     Duration,
+    IgnoreMode,
     RemovalPolicy,
     aws_s3 as s3,
     aws_lambda as _lambda,
@@ -11,56 +16,116 @@ from aws_cdk import (
     CfnOutput
 )
 from constructs import Construct
+from pathlib import Path
+
+# Asset paths resolved once at import, relative to the repo (not to the cwd of `cdk synth`)
+REPO_ROOT = Path(__file__).parent.parent.parent
+EXTRACTOR_ASSET = str(REPO_ROOT / "lambda" / "extractor")
+LAYER_ASSET = str(REPO_ROOT / "python.zip")
+# Only the handler sources go into the function zip; deps come from the layer
+EXTRACTOR_EXCLUDE = ["Dockerfile", "requirements*.txt", "__pycache__"]
+# The image build needs the Dockerfile and requirements_layer.txt; keep local bytecode out of its hash
+EXTRACTOR_IMAGE_EXCLUDE = ["__pycache__", "requirements.txt"]
+
+# Lambda settings shared by the layer and the function, built once
+LAMBDA_RUNTIME = _lambda.Runtime.PYTHON_3_12
+LAMBDA_ARCHITECTURE = _lambda.Architecture.ARM_64
+LAMBDA_TIMEOUT = Duration.minutes(1)
+
+
+@lru_cache(maxsize=16)
+def managed_policy(name: str) -> iam.IManagedPolicy:
+    """AWS managed policy reference, built once per name and shared by every stack instance."""
+    return iam.ManagedPolicy.from_aws_managed_policy_name(name)
+
+
+def asset_hash_props(env_var: str) -> dict:
+    """
+    Precomputed asset hash from `env_var` (e.g. `git rev-parse HEAD:lambda/extractor` in CI),
+    so CDK skips walking and hashing the asset on every synth. Unset → CDK hashes the source.
+    """
+    asset_hash = os.environ.get(env_var)
+    if not asset_hash:
+        return {}
+    return {"asset_hash_type": AssetHashType.CUSTOM, "asset_hash": asset_hash}
 
 class DataPipelineStack(Stack):
-    def __init__(self, scope: Construct, id: str, **kwargs):
+    def __init__(self, scope: Construct, id: str, retain: bool = False, **kwargs):
+        """
+        retain=True keeps the buckets (and their data) when the stack is deleted,
+        instead of emptying and destroying them.
+        """
         super().__init__(scope, id, **kwargs)
 
         # --- S3 ---
-        data_bucket = s3.Bucket(self, "DataBucket",
-            auto_delete_objects=True,
-            removal_policy=RemovalPolicy.DESTROY,
+        bucket_props = dict(
+            auto_delete_objects=not retain,
+            removal_policy=RemovalPolicy.RETAIN if retain else RemovalPolicy.DESTROY,
             block_public_access=s3.BlockPublicAccess.BLOCK_ALL
         )
+        data_bucket = s3.Bucket(self, "DataBucket", **bucket_props)
 
-        results_bucket = s3.Bucket(self, "AthenaResults",
-            auto_delete_objects=True,
-            removal_policy=RemovalPolicy.DESTROY,
-            block_public_access=s3.BlockPublicAccess.BLOCK_ALL
-        )
+        results_bucket = s3.Bucket(self, "AthenaResults", **bucket_props)
+
+        # Bucket tokens read once and reused below
+        data_bucket_name = data_bucket.bucket_name
+        data_bucket_arn = data_bucket.bucket_arn
     
         # --- Lambda ---
-        deps_layer = _lambda.LayerVersion(
-            self, "DepsLayer",
-            code=_lambda.Code.from_asset("../python.zip"),
-            compatible_runtimes=[_lambda.Runtime.PYTHON_3_12],
-            compatible_architectures=[_lambda.Architecture.ARM_64],
-            description="Prebuilt deps (requests, pyarrow, etc.)"
-        )
-
         lambda_role = iam.Role(self, "LambdaRole",
             assumed_by=iam.ServicePrincipal("lambda.amazonaws.com")
         )
         lambda_role.add_managed_policy(
-            iam.ManagedPolicy.from_aws_managed_policy_name("service-role/AWSLambdaBasicExecutionRole")
+            managed_policy("service-role/AWSLambdaBasicExecutionRole")
         )
         data_bucket.grant_read_write(lambda_role)
 
-        extractor = _lambda.Function(self, "ExtractorFunction",
-            runtime=_lambda.Runtime.PYTHON_3_12,
-            architecture=_lambda.Architecture.ARM_64,
-            handler="lambda_function.handler",
-            code=_lambda.Code.from_asset("../lambda/extractor"),
-            timeout=Duration.minutes(1),
+        extractor_props = dict(
+            architecture=LAMBDA_ARCHITECTURE,
+            timeout=LAMBDA_TIMEOUT,
             environment={
-                "BUCKET": data_bucket.bucket_name,
+                "BUCKET": data_bucket_name,
                 "API_URL": "https://randomuser.me/api/?results=100",
-                "FILE_FORMAT": "parquet"
+                "FILE_FORMAT": "parquet",
+                # Skip pydantic plugin discovery when the TypeAdapters are built on cold start
+                "PYDANTIC_DISABLE_PLUGINS": "1"
             },
             role=lambda_role,
-            layers=[deps_layer]
         )
 
+        # `cdk deploy -c extractor_image=true` ships the extractor as a container image
+        # (lambda/extractor/Dockerfile): Lambda loads image chunks on demand instead of
+        # extracting the whole pyarrow layer on cold start
+        if str(self.node.try_get_context("extractor_image")).lower() == "true":
+            extractor = _lambda.DockerImageFunction(self, "ExtractorFunction",
+                code=_lambda.DockerImageCode.from_image_asset(
+                    EXTRACTOR_ASSET, exclude=EXTRACTOR_IMAGE_EXCLUDE
+                ),
+                **extractor_props
+            )
+        else:
+            deps_layer = _lambda.LayerVersion(
+                self, "DepsLayer",
+                code=_lambda.Code.from_asset(LAYER_ASSET, **asset_hash_props("LAYER_HASH")),
+                compatible_runtimes=[LAMBDA_RUNTIME],
+                compatible_architectures=[LAMBDA_ARCHITECTURE],
+                description="Prebuilt deps (requests, pyarrow, etc.)"
+            )
+
+            extractor = _lambda.Function(self, "ExtractorFunction",
+                runtime=LAMBDA_RUNTIME,
+                handler="lambda_function.handler",
+                code=_lambda.Code.from_asset(
+                    EXTRACTOR_ASSET,
+                    exclude=EXTRACTOR_EXCLUDE,
+                    # git-style matcher: one pass over the tree for the whole exclude list
+                    ignore_mode=IgnoreMode.GIT,
+                    **asset_hash_props("EXTRACTOR_HASH")
+                ),
+                layers=[deps_layer],
+                **extractor_props
+            )
+
         # --- Glue ---
         glue_db = glue.CfnDatabase(self, "GlueDB",
             catalog_id=self.account,
@@ -70,7 +135,7 @@ class DataPipelineStack(Stack):
         crawler_role = iam.Role(self, "CrawlerRole",
             assumed_by=iam.ServicePrincipal("glue.amazonaws.com"),
             managed_policies=[
-                iam.ManagedPolicy.from_aws_managed_policy_name("AdministratorAccess")
+                managed_policy("AdministratorAccess")
             ]
         )
 
@@ -84,46 +149,38 @@ class DataPipelineStack(Stack):
             ]
         )
 
-        lf.CfnPermissions(self, "GlueDBPerms",
-            data_lake_principal={"dataLakePrincipalIdentifier": crawler_role.role_arn},
-            resource={"databaseResource": {"name": "users_db"}},
-            permissions=["CREATE_TABLE", "ALTER", "DESCRIBE"]
-        )
-
-        
         data_bucket.grant_read(crawler_role)
 
         glue.CfnCrawler(self, "UsersCrawler",
             role=crawler_role.role_arn,
             database_name=glue_db.ref,
-            targets={"s3Targets": [{"path": f"s3://{data_bucket.bucket_name}/"}]},
+            targets={"s3Targets": [{"path": f"s3://{data_bucket_name}/"}]},
             schema_change_policy={"deleteBehavior": "LOG", "updateBehavior": "UPDATE_IN_DATABASE"}
         )
 
         # --- Lake Formation ---
         lf.CfnResource(self, "LFDataLocation",
-            resource_arn=data_bucket.bucket_arn,
+            resource_arn=data_bucket_arn,
             use_service_linked_role=False,
             role_arn=crawler_role.role_arn
         )
 
-        lf.CfnPermissions(self, "CrawlerPerms",
-            data_lake_principal={"dataLakePrincipalIdentifier": crawler_role.role_arn},
-            resource={"databaseResource": {"name": "users_db"}},
-            permissions=["ALL"]
-        )
-
-        lf.CfnPermissions(self, "CrawlerPermst",
-            data_lake_principal={"dataLakePrincipalIdentifier": crawler_role.role_arn},
-            resource={"dataLocationResource": {"s3Resource": data_bucket.bucket_arn}},
-            permissions=["DATA_LOCATION_ACCESS"]
-        )
-
-        lf.CfnPermissions(self, "LambdaPerms",
-            data_lake_principal={"dataLakePrincipalIdentifier": lambda_role.role_arn},
-            resource={"dataLocationResource": {"s3Resource": data_bucket.bucket_arn}},
-            permissions=["DATA_LOCATION_ACCESS"]
-        )
+        # Ref on the Glue DB (not the literal name) so grants are created after the database
+        db_resource = {"databaseResource": {"name": glue_db.ref}}
+        location_resource = {"dataLocationResource": {"s3Resource": data_bucket_arn}}
+        # ALL on the database already covers CREATE_TABLE/ALTER/DESCRIBE for the crawler
+        lf_grants = [
+            # (logical id, principal, resource, permissions)
+            ("CrawlerPerms", crawler_role.role_arn, db_resource, ["ALL"]),
+            ("CrawlerPermst", crawler_role.role_arn, location_resource, ["DATA_LOCATION_ACCESS"]),
+            ("LambdaPerms", lambda_role.role_arn, location_resource, ["DATA_LOCATION_ACCESS"]),
+        ]
+        for logical_id, principal_arn, resource, permissions in lf_grants:
+            lf.CfnPermissions(self, logical_id,
+                data_lake_principal={"dataLakePrincipalIdentifier": principal_arn},
+                resource=resource,
+                permissions=permissions
+            )
 
         # --- Athena ---
         athena.CfnWorkGroup(self, "AthenaWG",
@@ -136,6 +193,10 @@ class DataPipelineStack(Stack):
         )
 
         # --- Outputs ---
-        CfnOutput(self, "DataBucketNameOutput", value=data_bucket.bucket_name)
-        CfnOutput(self, "GlueDBNameOutput", value="users_db")
-        CfnOutput(self, "LambdaNameOutput", value=extractor.function_name)
+        # Single JSON output (nothing imports these cross-stack); EMIT_OUTPUTS=0 omits it
+        if os.environ.get("EMIT_OUTPUTS", "1") == "1":
+            CfnOutput(self, "StackOutputs", value=self.to_json_string({
+                "dataBucketName": data_bucket_name,
+                "glueDbName": "users_db",
+                "lambdaName": extractor.function_name,
+            }))
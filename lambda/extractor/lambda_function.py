@@ -1,56 +1,112 @@
 import os
-import json
 import logging
 import time
+import zlib
 from datetime import datetime
 from io import BytesIO
-from typing import List, Optional
+from operator import itemgetter
+from typing import BinaryIO, List, Optional, Union
 
 import boto3
-import requests
-from requests.adapters import HTTPAdapter, Retry
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+import urllib3
+
+# orjson no viene en el layer prebuilt (python.zip) ni en el runtime: si falta,
+# se parsea y serializa con json de la stdlib (mismo resultado, más lento)
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    import json
+    HAS_ORJSON = False
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-s3 = boto3.client("s3")
+S3_MAX_CONCURRENCY = 4
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+
+# Cliente a nivel de módulo con keepalive: las invocaciones "warm" reutilizan sus conexiones.
+# El pool cubre todas las partes concurrentes de un multipart
+s3 = boto3.client("s3", config=Config(
+    max_pool_connections=S3_MAX_CONCURRENCY,
+    retries={"mode": "adaptive", "max_attempts": 3},
+    tcp_keepalive=True,
+))
+
+# Objetos > 8MB se suben en multipart con partes concurrentes; los pequeños siguen en un solo PUT
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=MULTIPART_THRESHOLD,
+    multipart_chunksize=MULTIPART_THRESHOLD,
+    max_concurrency=S3_MAX_CONCURRENCY,
+    use_threads=True,
+)
 
 BUCKET = os.environ.get("BUCKET", "datapipelinestack-databuckete3889a50-gnj55fcp3puh")
 PREFIX = os.environ.get("PREFIX", "raw/")
 API_URL = os.environ.get("API_URL", "https://randomuser.me/api/?results=100")
 FILE_FORMAT = (os.environ.get("FILE_FORMAT", "parquet") or "ndjson").lower()
+# randomuser.me es de confianza: por defecto no se valida con pydantic.
+# STRICT_SCHEMA=true activa la validación completa contra schema.py
+STRICT_SCHEMA = os.environ.get("STRICT_SCHEMA", "false").lower() in ("1", "true", "yes")
 
-# try import pyarrow from layer; if not available, HAS_PYARROW = False
-try:
-    import pyarrow as pa
-    import pyarrow.parquet as pq
-    HAS_PYARROW = True
-except Exception:
-    HAS_PYARROW = False
+if STRICT_SCHEMA:
+    from pydantic import ValidationError
+
+    from schema import RESPONSE_ADAPTER, USER_ADAPTER, USERS_ADAPTER
+
+# pyarrow solo se importa si se va a escribir Parquet: los contenedores NDJSON
+# no cargan sus páginas del layer. Si no está disponible, HAS_PYARROW = False
+HAS_PYARROW = False
+if FILE_FORMAT == "parquet":
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        HAS_PYARROW = True
+    except Exception:
+        pass
+
+# Formato decidido una vez por contenedor (no en cada invocación)
+WRITE_PARQUET = FILE_FORMAT == "parquet" and HAS_PYARROW
+if FILE_FORMAT == "parquet" and not HAS_PYARROW:
+    logger.warning("FILE_FORMAT=parquet but pyarrow is not available; writing NDJSON")
 
 
 # -------- Helpers --------
-def http_session_with_retries() -> requests.Session:
-    s = requests.Session()
-    retries = Retry(
+def http_pool_with_retries() -> urllib3.PoolManager:
+    retries = urllib3.Retry(
         total=3,
         backoff_factor=0.5,
         status_forcelist=(429, 500, 502, 503, 504),
         allowed_methods=frozenset(["GET"]),
         raise_on_status=False,
     )
-    s.mount("https://", HTTPAdapter(max_retries=retries))
-    s.mount("http://", HTTPAdapter(max_retries=retries))
-    return s
+    # Una sola conexión: el Lambda hace un único GET por invocación
+    return urllib3.PoolManager(
+        num_pools=1,
+        maxsize=1,
+        retries=retries,
+        timeout=urllib3.Timeout(connect=2.0, read=10.0),
+    )
 
 
-def get_in(d: dict, path: List[str], default=None):
-    cur = d
-    for k in path:
-        if not isinstance(cur, dict) or k not in cur:
-            return default
-        cur = cur[k]
-    return cur
+# Pool a nivel de módulo: la conexión keep-alive (y su sesión TLS) con la API
+# se reutiliza entre invocaciones "warm"
+http_pool = http_pool_with_retries()
+
+
+if HAS_ORJSON:
+    json_loads = orjson.loads
+
+    def ndjson_line(record: dict) -> bytes:
+        return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+else:
+    json_loads = json.loads
+
+    def ndjson_line(record: dict) -> bytes:
+        # Compacto y UTF-8 como orjson
+        return (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
 
 
 def as_iso(dt_str: Optional[str]) -> Optional[str]:
@@ -69,43 +125,174 @@ def to_str(x) -> Optional[str]:
     return str(x)
 
 
+def to_int_or_none(v) -> Optional[int]:
+    """
+    Asegura que los ints realmente sean ints (o None).
+    Si viene como string numérica, la convertimos a int; si no, None.
+    """
+    if v is None:
+        return None
+    if isinstance(v, int):
+        return v
+    try:
+        # Evita floats en edades/nums
+        return int(str(v))
+    except Exception:
+        return None
+
+
+def as_dict(v) -> dict:
+    # Contenedor anidado ausente, None o de otro tipo (str, list) → {}
+    return v if isinstance(v, dict) else {}
+
+
 def normalize_item(raw: dict) -> dict:
     """
     Aplana el item a un registro plano con tipos consistentes.
-    Forzamos strings en campos propensos a ser mixtos (postcode, phone, cell, id_value).
+    Forzamos strings en campos propensos a ser mixtos (postcode, phone, cell, id_value)
+    e ints en los enteros del esquema Parquet, así el registro ya sale listo para Arrow.
+    Cada contenedor anidado se lee una sola vez a un local (ausente o no dict → {}).
     """
+    get = raw.get
+    name = as_dict(get("name"))
+    loc = as_dict(get("location"))
+    street = as_dict(loc.get("street"))
+    dob = as_dict(get("dob"))
+    reg = as_dict(get("registered"))
+    login = as_dict(get("login"))
+    pic = as_dict(get("picture"))
+    idd = as_dict(get("id"))
     return {
-        "gender": to_str(get_in(raw, ["gender"])),
-        "first_name": to_str(get_in(raw, ["name", "first"])),
-        "last_name": to_str(get_in(raw, ["name", "last"])),
-        "email": to_str(get_in(raw, ["email"])),
-        "country": to_str(get_in(raw, ["location", "country"])),
-        "state": to_str(get_in(raw, ["location", "state"])),
-        "city": to_str(get_in(raw, ["location", "city"])),
+        "gender": to_str(get("gender")),
+        "first_name": to_str(name.get("first")),
+        "last_name": to_str(name.get("last")),
+        "email": to_str(get("email")),
+        "country": to_str(loc.get("country")),
+        "state": to_str(loc.get("state")),
+        "city": to_str(loc.get("city")),
         # postcode puede ser int o string en la API → siempre string
-        "postcode": to_str(get_in(raw, ["location", "postcode"])),
-        "street_number": get_in(raw, ["location", "street", "number"]),
-        "street_name": to_str(get_in(raw, ["location", "street", "name"])),
-        "phone": to_str(get_in(raw, ["phone"])),
-        "cell": to_str(get_in(raw, ["cell"])),
-        "nat": to_str(get_in(raw, ["nat"])),
-        "dob": as_iso(get_in(raw, ["dob", "date"])),
-        "age": get_in(raw, ["dob", "age"]),
-        "registered_date": as_iso(get_in(raw, ["registered", "date"])),
-        "registered_age": get_in(raw, ["registered", "age"]),
-        "uuid": to_str(get_in(raw, ["login", "uuid"])),
-        "username": to_str(get_in(raw, ["login", "username"])),
-        "picture_large": to_str(get_in(raw, ["picture", "large"])),
-        "picture_medium": to_str(get_in(raw, ["picture", "medium"])),
-        "picture_thumbnail": to_str(get_in(raw, ["picture", "thumbnail"])),
-        "id_name": to_str(get_in(raw, ["id", "name"])),
-        "id_value": to_str(get_in(raw, ["id", "value"])),
+        "postcode": to_str(loc.get("postcode")),
+        "street_number": to_int_or_none(street.get("number")),
+        "street_name": to_str(street.get("name")),
+        "phone": to_str(get("phone")),
+        "cell": to_str(get("cell")),
+        "nat": to_str(get("nat")),
+        "dob": as_iso(dob.get("date")),
+        "age": to_int_or_none(dob.get("age")),
+        "registered_date": as_iso(reg.get("date")),
+        "registered_age": to_int_or_none(reg.get("age")),
+        "uuid": to_str(login.get("uuid")),
+        "username": to_str(login.get("username")),
+        "picture_large": to_str(pic.get("large")),
+        "picture_medium": to_str(pic.get("medium")),
+        "picture_thumbnail": to_str(pic.get("thumbnail")),
+        "id_name": to_str(idd.get("name")),
+        "id_value": to_str(idd.get("value")),
     }
 
 
-def to_ndjson_bytes(records: List[dict]) -> bytes:
-    lines = [json.dumps(r, default=str, ensure_ascii=False) for r in records]
-    return ("\n".join(lines) + "\n").encode("utf-8")
+def validate_each(items: list) -> List[dict]:
+    """Valida ítem por ítem y descarta solo los inválidos."""
+    valid = []
+    for idx, it in enumerate(items):
+        try:
+            valid.append(USER_ADAPTER.validate_python(it))
+        except ValidationError as e:
+            logger.warning("Dropping invalid record %d: %s", idx, e.errors()[0]["msg"])
+    return valid
+
+
+def validate_items(items: list) -> List[dict]:
+    """
+    Valida el lote completo con una sola llamada a pydantic-core.
+    Si el lote falla, valida ítem por ítem y descarta solo los inválidos.
+    """
+    try:
+        return USERS_ADAPTER.validate_python(items)
+    except ValidationError as e:
+        logger.warning("Batch validation failed (%d errors), validating per item", e.error_count())
+    return validate_each(items)
+
+
+def extract_items(payload) -> list:
+    items = payload.get("results") or payload.get("data") or payload
+    if isinstance(items, dict):
+        items = [items]
+    if not isinstance(items, list):
+        logger.error("Unexpected payload shape: %s", type(items))
+        raise RuntimeError("Unexpected payload shape")
+    return items
+
+
+def parse_users(body: bytes):
+    """
+    Parsea y valida el body JSON en una sola pasada en Rust (jiter + pydantic-core),
+    sin dict intermedio. Devuelve (items_recibidos, registros_validos).
+    Si el lote no valida, cae a json_loads + validación por ítem (el lote ya falló: no se
+    revalida entero). Si el payload no trae results/data, se valida como lote.
+    """
+    try:
+        parsed = RESPONSE_ADAPTER.validate_json(body)
+    except ValidationError as e:
+        logger.warning("Response validation failed (%d errors), validating per item", e.error_count())
+        items = extract_items(json_loads(body))
+        return len(items), validate_each(items)
+
+    users = parsed.get("results") or parsed.get("data")
+    if users:
+        return len(users), users
+    items = extract_items(json_loads(body))
+    return len(items), validate_items(items)
+
+
+def load_users(body: bytes):
+    """
+    Camino por defecto (payload de confianza): json_loads + dicts crudos, sin pydantic.
+    Devuelve (items_recibidos, items); los que no son dict se descartan al normalizar.
+    """
+    items = extract_items(json_loads(body))
+    return len(items), items
+
+
+def to_ndjson_gzip(records: List[dict]) -> BytesIO:
+    """
+    Serializa a NDJSON y comprime con gzip en streaming, línea por línea.
+    Solo vive el buffer comprimido (listo para subir), nunca el NDJSON completo.
+    """
+    out = BytesIO()
+    write = out.write
+    # wbits=31 → formato gzip (cabecera + CRC); nivel 6: el 9 de gzip.compress es ~5x más lento
+    compress = zlib.compressobj(6, zlib.DEFLATED, 31)
+    dumps = ndjson_line
+    for r in records:
+        write(compress.compress(dumps(r)))
+    write(compress.flush())
+    out.seek(0)
+    return out
+
+
+# Columnas de salida (mismo orden que normalize_item y parquet_schema)
+COLUMNS = (
+    "gender", "first_name", "last_name", "email", "country", "state", "city",
+    "postcode", "street_number", "street_name", "phone", "cell", "nat", "dob",
+    "age", "registered_date", "registered_age", "uuid", "username",
+    "picture_large", "picture_medium", "picture_thumbnail", "id_name", "id_value",
+)
+# Extrae las 24 columnas de un registro en una sola llamada en C (tupla en orden de COLUMNS)
+ROW_VALUES = itemgetter(*COLUMNS)
+
+# Columnas enteras del esquema Parquet (normalize_item ya las entrega como int/None)
+INT_COLUMNS = ("street_number", "age", "registered_age")
+
+# Columnas de baja cardinalidad: solo estas se codifican con diccionario en Parquet
+DICTIONARY_COLUMNS = ["gender", "nat", "country", "state"]
+
+# Estadísticas min/max solo en columnas por las que se filtra en Athena (categóricas y enteras);
+# en emails, URLs o uuids no sirven para podar y ocupan espacio en el footer
+STATISTICS_COLUMNS = DICTIONARY_COLUMNS + list(INT_COLUMNS)
+
+# Filas por RecordBatch (y por row group) al escribir Parquet
+PARQUET_BATCH_ROWS = 1024
 
 
 def parquet_schema() -> "pa.Schema":
@@ -138,47 +325,54 @@ def parquet_schema() -> "pa.Schema":
     ])
 
 
-def cast_for_arrow(record: dict) -> dict:
-    """
-    Asegura que ints realmente sean ints (o None), y strings sean strings.
-    Si un campo int viene como string numérica, lo convertimos a int; si no, lo dejamos None.
-    """
-    def to_int_or_none(v):
-        if v is None:
-            return None
-        if isinstance(v, int):
-            return v
-        try:
-            # Evita floats en edades/nums
-            return int(str(v))
-        except Exception:
-            return None
-
-    rec = dict(record)  # shallow copy
-    rec["street_number"] = to_int_or_none(rec.get("street_number"))
-    rec["age"] = to_int_or_none(rec.get("age"))
-    rec["registered_age"] = to_int_or_none(rec.get("registered_age"))
-    # El resto ya va como string/None por normalize_item
-    return rec
+# Esquema construido una sola vez al importar
+PARQUET_SCHEMA = parquet_schema() if HAS_PYARROW else None
 
 
-def to_parquet_bytes(records: List[dict]) -> bytes:
+def to_parquet_buffer(records: List[dict]) -> "pa.BufferReader":
     if not HAS_PYARROW:
         raise RuntimeError("pyarrow not available for parquet conversion")
-    sch = parquet_schema()
-    casted = [cast_for_arrow(r) for r in records]
-    table = pa.Table.from_pylist(casted, schema=sch)
-    buf = BytesIO()
-    pq.write_table(table, buf, compression="snappy")
-    buf.seek(0)
-    return buf.read()
-
-
-def upload_bytes(bucket: str, key: str, data: bytes, content_type: Optional[str] = None):
+    # Buffer nativo de Arrow: el writer escribe en C++, sin llamadas a un BytesIO de Python por página
+    out = pa.BufferOutputStream()
+    # Se escribe por lotes de PARQUET_BATCH_ROWS: la memoria pico queda acotada al lote,
+    # nunca todas las filas como columnas y como Table a la vez
+    with pq.ParquetWriter(
+        out,
+        PARQUET_SCHEMA,
+        compression="snappy",
+        use_dictionary=DICTIONARY_COLUMNS,
+        write_statistics=STATISTICS_COLUMNS,
+    ) as writer:
+        for start in range(0, len(records), PARQUET_BATCH_ROWS):
+            batch = records[start:start + PARQUET_BATCH_ROWS]
+            # Filas → columnas (SoA), en lugar de que from_pylist transponga dict por dict
+            cols = dict(zip(COLUMNS, zip(*map(ROW_VALUES, batch))))
+            writer.write_batch(pa.RecordBatch.from_pydict(cols, schema=PARQUET_SCHEMA))
+    # Lector seekable sobre el mismo buffer (sin copia), se pasa tal cual como Body
+    return pa.BufferReader(out.getvalue())
+
+
+def upload_bytes(
+    bucket: str,
+    key: str,
+    data: Union[bytes, BinaryIO],
+    content_type: Optional[str] = None,
+    content_encoding: Optional[str] = None,
+):
     extra = {}
     if content_type:
         extra["ContentType"] = content_type
-    s3.put_object(Bucket=bucket, Key=key, Body=data, **extra)
+    if content_encoding:
+        extra["ContentEncoding"] = content_encoding
+    body = BytesIO(data) if isinstance(data, bytes) else data
+    size = body.seek(0, 2)
+    body.seek(0)
+    # Bajo el umbral de multipart: un solo PUT directo, sin levantar el TransferManager
+    # (hilos, futures) que upload_fileobj crea en cada llamada
+    if size < MULTIPART_THRESHOLD:
+        s3.put_object(Bucket=bucket, Key=key, Body=body, **extra)
+        return
+    s3.upload_fileobj(body, bucket, key, ExtraArgs=extra, Config=TRANSFER_CONFIG)
 
 
 # -------- Handler --------
@@ -193,38 +387,37 @@ def handler(event, context):
     logger.info("Invoked. API=%s format=%s", API_URL, FILE_FORMAT)
 
     try:
-        sess = http_session_with_retries()
-        resp = sess.get(API_URL, timeout=30)
-        resp.raise_for_status()
-        payload = resp.json()
+        resp = http_pool.request("GET", API_URL)
+        if resp.status >= 400:
+            raise RuntimeError(f"API returned HTTP {resp.status}")
     except Exception as e:
         logger.exception("Failed to fetch API: %s", e)
         raise
 
-    items = payload.get("results") or payload.get("data") or payload
-    if isinstance(items, dict):
-        items = [items]
-    if not isinstance(items, list):
-        logger.error("Unexpected payload shape: %s", type(items))
-        raise RuntimeError("Unexpected payload shape")
+    try:
+        # Con STRICT_SCHEMA: parseo + validación de esquema directamente sobre los bytes
+        fetched, users = parse_users(resp.data) if STRICT_SCHEMA else load_users(resp.data)
+    except Exception as e:
+        logger.exception("Failed to parse API response: %s", e)
+        raise
 
-    # Normalización sin validaciones de esquema
-    normalized = [normalize_item(x) for x in items if isinstance(x, dict)]
+    # Filtrado y normalización en una sola comprensión (sin lista intermedia)
+    normalized = [normalize_item(x) for x in users if isinstance(x, dict)]
 
     if not normalized:
         logger.warning("No valid records after fetch")
-        return {"status": "no_records", "fetched": len(items)}
+        return {"status": "no_records", "fetched": fetched}
 
     ts = int(time.time())
     base = f"{PREFIX.rstrip('/')}/users_{ts}"
     count = len(normalized)
 
     # Try Parquet if requested
-    if FILE_FORMAT == "parquet":
+    if WRITE_PARQUET:
         try:
-            parquet_bytes = to_parquet_bytes(normalized)
+            parquet_buf = to_parquet_buffer(normalized)
             key = f"{base}.parquet"
-            upload_bytes(BUCKET, key, parquet_bytes, content_type="application/octet-stream")
+            upload_bytes(BUCKET, key, parquet_buf, content_type="application/octet-stream")
             logger.info("Wrote %d records to s3://%s/%s (parquet)", count, BUCKET, key)
             return {"status": "ok", "key": key, "format": "parquet", "records": count}
         except Exception as e:
@@ -232,10 +425,15 @@ def handler(event, context):
 
     # Fallback NDJSON
     try:
-        ndjson = to_ndjson_bytes(normalized)
-        key = f"{base}.ndjson"
-        upload_bytes(BUCKET, key, ndjson, content_type="application/x-ndjson; charset=utf-8")
-        logger.info("Wrote %d records to s3://%s/%s (ndjson)", count, BUCKET, key)
+        # gzip: Glue y Athena leen .gz de forma transparente
+        ndjson = to_ndjson_gzip(normalized)
+        key = f"{base}.ndjson.gz"
+        upload_bytes(
+            BUCKET, key, ndjson,
+            content_type="application/x-ndjson; charset=utf-8",
+            content_encoding="gzip",
+        )
+        logger.info("Wrote %d records to s3://%s/%s (ndjson.gz)", count, BUCKET, key)
         return {"status": "ok", "key": key, "format": "ndjson", "records": count}
     except Exception as e:
         logger.exception("Failed uploading NDJSON: %s", e)
@@ -0,0 +1,93 @@
+from typing import List, Optional, Union
+
+from pydantic import TypeAdapter
+# pydantic exige el TypedDict de typing_extensions en Python < 3.12
+from typing_extensions import Required, TypedDict
+
+
+# Esquemas del payload de randomuser.me (solo los campos que usamos o documentamos).
+# TypedDict en lugar de BaseModel: pydantic-core valida directo a dicts planos, sin
+# construir un objeto Python por cada sub-modelo. Los campos extra de la API se descartan.
+class NameModel(TypedDict, total=False):
+    title: Optional[str]
+    first: Required[str]
+    last: Required[str]
+
+
+class StreetModel(TypedDict, total=False):
+    number: Optional[int]
+    name: Optional[str]
+
+
+class CoordinatesModel(TypedDict, total=False):
+    latitude: Optional[str]
+    longitude: Optional[str]
+
+
+class TimezoneModel(TypedDict, total=False):
+    offset: Optional[str]
+    description: Optional[str]
+
+
+class LocationModel(TypedDict, total=False):
+    street: Optional[StreetModel]
+    city: Required[str]
+    state: Optional[str]
+    country: Required[str]
+    # postcode puede ser int o string en la API
+    postcode: Optional[Union[str, int]]
+    coordinates: Optional[CoordinatesModel]
+    timezone: Optional[TimezoneModel]
+
+
+class LoginModel(TypedDict, total=False):
+    uuid: Required[str]
+    username: Optional[str]
+
+
+class DobModel(TypedDict, total=False):
+    date: Optional[str]
+    age: Optional[int]
+
+
+class RegisteredModel(TypedDict, total=False):
+    date: Optional[str]
+    age: Optional[int]
+
+
+class IdModel(TypedDict, total=False):
+    name: Optional[str]
+    value: Optional[str]
+
+
+class PictureModel(TypedDict, total=False):
+    large: Optional[str]
+    medium: Optional[str]
+    thumbnail: Optional[str]
+
+
+class UserModel(TypedDict, total=False):
+    gender: Optional[str]
+    name: Required[NameModel]
+    location: Required[LocationModel]
+    email: Required[str]
+    login: Optional[LoginModel]
+    dob: Optional[DobModel]
+    registered: Optional[RegisteredModel]
+    phone: Optional[str]
+    cell: Optional[str]
+    id: Optional[IdModel]
+    picture: Optional[PictureModel]
+    nat: Optional[str]
+
+
+class RandomUserResponse(TypedDict, total=False):
+    # randomuser.me responde en "results"; "data" por compatibilidad con otras APIs
+    results: List[UserModel]
+    data: List[UserModel]
+
+
+# Adapters construidos una sola vez (al importar): el esquema se compila una vez por contenedor
+USER_ADAPTER = TypeAdapter(UserModel)
+USERS_ADAPTER = TypeAdapter(List[UserModel])
+RESPONSE_ADAPTER = TypeAdapter(RandomUserResponse)
@@ -0,0 +1,7 @@
+# tests/conftest.py
+import os
+import sys
+
+# "lambda" es palabra reservada: el código del extractor se importa como módulos de nivel superior,
+# igual que en el runtime de Lambda
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda", "extractor"))
@@ -0,0 +1,159 @@
+# tests/test_lambda_function.py
+import gzip
+import importlib
+import json
+import sys
+
+import orjson
+import pyarrow.parquet as pq
+import pytest
+from botocore.stub import ANY, Stubber
+
+import lambda_function
+from lambda_function import load_users, normalize_item, to_ndjson_gzip, to_parquet_buffer
+
+def test_normalize_item_flattens_and_stringifies():
+    raw = {
+        "gender": "female",
+        "name": {"first": "Ana", "last": "Ruiz"},
+        "email": "ana@example.com",
+        "location": {
+            "street": {"number": 12, "name": "Calle 1"},
+            "city": "Cali",
+            "country": "CO",
+            "postcode": 760001,
+        },
+        "dob": {"date": "1990-01-01T00:00:00.000Z", "age": 35},
+        "id": {"name": "CC", "value": None},
+    }
+    rec = normalize_item(raw)
+    assert rec["first_name"] == "Ana"
+    assert rec["city"] == "Cali"
+    # postcode numérico → string
+    assert rec["postcode"] == "760001"
+    assert rec["street_number"] == 12
+    assert rec["dob"] == "1990-01-01T00:00:00+00:00"
+    assert rec["age"] == 35
+    # contenedores ausentes → None
+    assert rec["uuid"] is None
+    assert rec["registered_date"] is None
+    assert rec["id_value"] is None
+
+def test_normalize_item_tolerates_null_containers():
+    rec = normalize_item({"name": None, "location": {"street": None}})
+    assert rec["first_name"] is None
+    assert rec["street_number"] is None
+    # contenedores de otro tipo (str, list) → campos None, sin AttributeError
+    rec = normalize_item({"name": ["a"], "location": {"street": "x", "city": "Cali"}, "id": "abc"})
+    assert rec["first_name"] is None
+    assert rec["street_number"] is None
+    assert rec["city"] == "Cali"
+    assert rec["id_value"] is None
+    assert normalize_item({"location": "x"})["country"] is None
+
+def test_normalize_item_coerces_int_fields():
+    rec = normalize_item({"dob": {"age": "41"}, "registered": {"age": "n/a"}})
+    assert rec["age"] == 41
+    assert rec["registered_age"] is None
+
+def test_load_users_reads_results():
+    fetched, users = load_users(b'{"results": [{"gender": "male"}, "x"], "info": {}}')
+    assert fetched == 2
+    assert users == [{"gender": "male"}, "x"]
+
+def test_to_ndjson_gzip_roundtrip():
+    records = [{"first_name": "José", "age": 30}, {"first_name": None, "age": None}]
+    lines = gzip.decompress(to_ndjson_gzip(records).read()).decode("utf-8").splitlines()
+    assert [json.loads(line) for line in lines] == records
+
+def test_upload_bytes_small_body_uses_put_object():
+    with Stubber(lambda_function.s3) as stub:
+        stub.add_response("put_object", {}, {
+            "Bucket": "bucket",
+            "Key": "raw/users.ndjson.gz",
+            "Body": ANY,
+            "ContentType": "application/x-ndjson; charset=utf-8",
+            "ContentEncoding": "gzip",
+        })
+        lambda_function.upload_bytes(
+            "bucket", "raw/users.ndjson.gz", b"{}\n",
+            content_type="application/x-ndjson; charset=utf-8",
+            content_encoding="gzip",
+        )
+        stub.assert_no_pending_responses()
+
+class FakeResponse:
+    def __init__(self, status, data=b""):
+        self.status = status
+        self.data = data
+
+def test_handler_raises_on_http_error(monkeypatch):
+    monkeypatch.setattr(lambda_function.http_pool, "request", lambda method, url: FakeResponse(503))
+    with pytest.raises(RuntimeError, match="HTTP 503"):
+        lambda_function.handler({}, {})
+
+def test_handler_logs_unparseable_body(monkeypatch, caplog):
+    monkeypatch.setattr(lambda_function.http_pool, "request", lambda method, url: FakeResponse(200, b"<html>"))
+    with pytest.raises(ValueError):
+        lambda_function.handler({}, {})
+    assert "Failed to parse API response" in caplog.text
+
+def test_handler_uploads_fetched_records(monkeypatch):
+    body = json.dumps({"results": [{"gender": "female", "name": {"first": "Ana"}}]}).encode()
+    monkeypatch.setattr(lambda_function.http_pool, "request", lambda method, url: FakeResponse(200, body))
+    uploads = []
+    monkeypatch.setattr(lambda_function, "upload_bytes", lambda bucket, key, data, **kw: uploads.append(key))
+    out = lambda_function.handler({}, {})
+    assert out["status"] == "ok"
+    assert out["records"] == 1
+    assert uploads == [out["key"]]
+
+def test_to_parquet_buffer_roundtrip():
+    records = [normalize_item({"gender": "male", "dob": {"age": 30}}), normalize_item({})]
+    table = pq.read_table(to_parquet_buffer(records))
+    assert table.to_pylist() == records
+
+@pytest.fixture
+def strict_lambda(monkeypatch):
+    # STRICT_SCHEMA se lee al importar: se recarga el módulo con la variable activa
+    monkeypatch.setenv("STRICT_SCHEMA", "true")
+    yield importlib.reload(lambda_function)
+    monkeypatch.delenv("STRICT_SCHEMA")
+    importlib.reload(lambda_function)
+
+def make_user(first):
+    return {
+        "name": {"first": first, "last": "Doe"},
+        "email": f"{first.lower()}@example.com",
+        "location": {"city": "Bogota", "country": "CO", "postcode": 110111},
+    }
+
+def test_parse_users_strict_valid_batch(strict_lambda):
+    body = json.dumps({"results": [make_user("Ana"), make_user("Luis")], "info": {}}).encode()
+    fetched, users = strict_lambda.parse_users(body)
+    assert fetched == 2
+    assert [u["name"]["first"] for u in users] == ["Ana", "Luis"]
+
+def test_parse_users_strict_drops_invalid_record(strict_lambda, caplog):
+    body = json.dumps({"results": [make_user("Ana"), {"gender": "male"}]}).encode()
+    fetched, users = strict_lambda.parse_users(body)
+    assert fetched == 2
+    assert [u["name"]["first"] for u in users] == ["Ana"]
+    assert "Dropping invalid record 1" in caplog.text
+    # tras fallar la respuesta no se revalida el lote entero
+    assert "Batch validation failed" not in caplog.text
+
+@pytest.fixture
+def stdlib_json_lambda(monkeypatch):
+    # Sin orjson (como en el layer prebuilt python.zip): el módulo cae a json de la stdlib
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    yield importlib.reload(lambda_function)
+    monkeypatch.undo()
+    importlib.reload(lambda_function)
+
+def test_stdlib_json_fallback_matches_orjson(stdlib_json_lambda):
+    assert not stdlib_json_lambda.HAS_ORJSON
+    fetched, users = stdlib_json_lambda.load_users(b'{"results": [{"gender": "male"}]}')
+    assert (fetched, users) == (1, [{"gender": "male"}])
+    record = normalize_item({"name": {"first": "José"}, "dob": {"age": 30}})
+    assert stdlib_json_lambda.ndjson_line(record) == orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
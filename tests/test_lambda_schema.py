@@ -1,6 +1,6 @@
 # tests/test_lambda_schema.py
 import pytest
-from lambda.extractor.schema import UserModel
+from schema import USER_ADAPTER
 
 def test_user_model_minimal():
     raw = {
@@ -9,16 +9,16 @@ def test_user_model_minimal():
         "email": "john@example.com",
         "location": {"city": "Bogota", "country": "CO"}
     }
-    user = UserModel.parse_obj(raw)
-    assert user.name.first == "John"
-    assert user.name.last == "Doe"
-    assert user.email == "john@example.com"
-    assert user.location.city == "Bogota"
-    assert user.location.country == "CO"
+    user = USER_ADAPTER.validate_python(raw)
+    assert user["name"]["first"] == "John"
+    assert user["name"]["last"] == "Doe"
+    assert user["email"] == "john@example.com"
+    assert user["location"]["city"] == "Bogota"
+    assert user["location"]["country"] == "CO"
     # campos opcionales
-    assert user.name.title is None
-    assert user.dob is None
-    assert user.login is None
+    assert "title" not in user["name"]
+    assert "dob" not in user
+    assert "login" not in user
 
 def test_user_model_full():
     raw = {
@@ -47,9 +47,9 @@ def test_user_model_full():
         },
         "nat": "GB"
     }
-    user = UserModel.parse_obj(raw)
-    assert user.name.first == "Roland"
-    assert user.login.uuid == "df55d042-34b7-4e46-82b7-7d0b37af5a2e"
-    assert user.picture.large.startswith("https://")
-    assert user.dob.age == 34
-    assert user.location.state == "Cumbria"
+    user = USER_ADAPTER.validate_python(raw)
+    assert user["name"]["first"] == "Roland"
+    assert user["login"]["uuid"] == "df55d042-34b7-4e46-82b7-7d0b37af5a2e"
+    assert user["picture"]["large"].startswith("https://")
+    assert user["dob"]["age"] == 34
+    assert user["location"]["state"] == "Cumbria"